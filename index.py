@@ -1,151 +1,233 @@
 import spacy
+from spacy.attrs import ORTH, IS_ALPHA, POS, DEP
 from docx import Document
 from docx.shared import Inches
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
 from datetime import datetime
 
 from pathlib import Path
-import re
-from spellchecker import SpellChecker
+from spellchecker import SpellChecker, __version__ as SPELLCHECKER_VERSION
 import os
+import hashlib
+import copy
+from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
+import pickle
+import numpy as np
 
-# Load English language model
-nlp = spacy.load("en_core_web_sm")
-spell = SpellChecker()
+# Load English language model (only tagging and parsing are needed;
+# attribute_ruler stays enabled because it maps tags to token.pos_)
+nlp = spacy.load("en_core_web_sm", disable=["ner", "lemmatizer"])
+
+# Print per-file word counts and every clause found by calculate_dcr (slow on long texts)
+VERBOSE = False
+
+# Words the spell checker already knows; membership is a single hash lookup.
+# The set is pickled next to the script so later runs skip loading the spell
+# checker's dictionary; the file name carries the pyspellchecker version so an
+# upgrade rebuilds it.
+KNOWN_WORDS_CACHE = Path(__file__).with_name(f"known_words-{SPELLCHECKER_VERSION}.pkl")
+try:
+    with open(KNOWN_WORDS_CACHE, "rb") as cache_file:
+        known_words = pickle.load(cache_file)
+    if not isinstance(known_words, frozenset):
+        raise TypeError(f"{KNOWN_WORDS_CACHE} does not hold a frozenset")
+except Exception:
+    # Missing, unreadable or corrupt cache (a truncated pickle can raise many error types)
+    known_words = frozenset(SpellChecker().word_frequency.dictionary.keys())
+    # Write to a temporary file first so an interrupted run never leaves a partial
+    # cache; if the file can't be written the set is simply rebuilt next time
+    tmp_path = KNOWN_WORDS_CACHE.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as cache_file:
+            pickle.dump(known_words, cache_file, protocol=5)
+        os.replace(tmp_path, KNOWN_WORDS_CACHE)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+
+# Filtered texts are cached here per file so unchanged files are not filtered
+# again on later runs. Entries are also keyed by FILTER_VERSION and the versions of
+# pyspellchecker, spaCy and the language model (whose tokenizer splits the text):
+# bump FILTER_VERSION whenever filter_text's rules change.
+FILTER_CACHE_DIR = Path(__file__).with_name(".cache")
+FILTER_VERSION = 2
+
+# Contractions split off by the spaCy tokenizer and the words they expand to
+_CONTRACTIONS = {
+    "n't": "not",
+    "'ll": "will",
+    "'ve": "have",
+    "'re": "are",
+    "'d": "would",
+    "'m": "am"
+}
+
+# Single-letter words and abbreviations kept by filter_text
+_KEEP1 = frozenset({'a', 'i'})
+_ABBR = frozenset({'mr', 'mrs', 'ms', 'dr', 'prof', 'etc', 'vs', 'eg', 'ie'})
+
+# Parts of speech counted as lexical (content) words
+_LEX_POS = frozenset({'NOUN', 'VERB', 'ADJ', 'ADV'})
+_LEX_POS_IDS = np.array([nlp.vocab.strings[pos] for pos in _LEX_POS], dtype=np.uint64)
+
+# Dependency labels that mark a dependent clause
+_DEP_SET = frozenset({"ccomp", "advcl", "acl", "relcl", "xcomp", "pcomp"})
+_DEP_IDS = np.array([nlp.vocab.strings[dep] for dep in _DEP_SET], dtype=np.uint64)
 
 def filter_text(text):
     """Filters and cleans the input text by removing misspelled words"""
-    # Convert to lowercase
-    text = text.lower()
-    
-    # Handle common contractions and abbreviations
-    contractions = {
-        "n't": " not",
-        "'ll": " will",
-        "'ve": " have",
-        "'re": " are",
-        "'d": " would",
-        "'m": " am"
-    }
-    
-    for contraction, expansion in contractions.items():
-        text = text.replace(contraction, expansion)
-    
-    # Remove special characters but keep basic punctuation and apostrophes
-    text = re.sub(r'[^a-z\s.,!?;:()\']', ' ', text)
-    
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text)
-    
-    # Split into words and check spelling
-    words = text.split()
+    # Tokenize the lowercased text; the tokenizer alone splits off punctuation
+    # and contractions, without running the rest of the pipeline
     valid_words = []
     
-    for word in words:
-        # Skip single characters (except 'a' and 'i')
-        if len(word) == 1 and word not in ['a', 'i']:
+    for token in nlp.make_doc(text.lower()):
+        # Normalize curly apostrophes (common in text pasted from Word) so their
+        # clitics match the contraction table
+        word = token.text.replace("’", "'")
+        
+        # Expand common contractions
+        if word in _CONTRACTIONS:
+            valid_words.append(_CONTRACTIONS[word])
             continue
-            
-        # Keep common abbreviations and contractions
-        if word in ['mr', 'mrs', 'ms', 'dr', 'prof', 'etc', 'vs', 'eg', 'ie']:
-            valid_words.append(word)
+        
+        # Skip punctuation, numbers and other symbols
+        if not token.is_alpha:
+            continue
+        
+        # Skip single characters (except 'a' and 'i')
+        if len(word) == 1 and word not in _KEEP1:
             continue
             
-        # Only keep words that are spelled correctly
-        if spell.correction(word) == word:
+        # Keep common abbreviations, and otherwise only words that are spelled correctly
+        if word in _ABBR or word in known_words:
             valid_words.append(word)
     
     # Join valid words back together
-    filtered_text = ' '.join(valid_words)
+    return ' '.join(valid_words)
+
+def read_file(file_path):
+    """Reads a file (I/O only) and returns the arguments for filter_file: (cache_path, cached_text, text)"""
+    # Cache entries are keyed by FILTER_VERSION, the versions of the libraries the
+    # filter depends on and the file's path, modification time and size
+    file_path = Path(file_path).resolve()
+    stat = file_path.stat()
+    key = (f"{FILTER_VERSION}|{SPELLCHECKER_VERSION}|{spacy.__version__}|{nlp.meta['version']}|"
+           f"{file_path}|{stat.st_mtime_ns}|{stat.st_size}")
+    cache_path = FILTER_CACHE_DIR / (hashlib.sha1(key.encode("utf8")).hexdigest() + ".pkl")
+    try:
+        with open(cache_path, "rb") as cache_file:
+            cached_text = pickle.load(cache_file)
+        if isinstance(cached_text, str):
+            return cache_path, cached_text, None
+    except Exception:
+        # Missing, unreadable or corrupt entry: filter_file recomputes and overwrites it
+        pass
     
-    # Clean up any remaining artifacts
-    filtered_text = re.sub(r'\s+', ' ', filtered_text)
-    filtered_text = filtered_text.strip()
+    return cache_path, None, file_path.read_text(encoding="utf8")
+
+def filter_file(cache_path, cached_text, text):
+    """Returns cached_text if the cache had it, otherwise filters the raw text and caches it at cache_path"""
+    if cached_text is not None:
+        return cached_text
     
+    filtered_text = filter_text(text)
+    # Write to a temporary file first so an interrupted run never leaves a partial
+    # entry; if the cache can't be written the file is simply filtered again next time
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        FILTER_CACHE_DIR.mkdir(exist_ok=True)
+        with open(tmp_path, "wb") as cache_file:
+            pickle.dump(filtered_text, cache_file, protocol=5)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
     return filtered_text
 
-def calculate_ttr_spacy(text, segment_length=30):
-    """Measures the Type-Token Ratio (TTR), Moving Average Type-Token Ratio (MATTR), and Lexical Density"""
-    # Filter text before processing
-    filtered_text = filter_text(text)
-    doc = nlp(filtered_text.lower())  # Process filtered text
+def calculate_mattr(tokens, segment_length):
+    """Averages the TTR of every window of segment_length consecutive tokens (needs at least one full window)"""
+    tokens = np.asarray(tokens)
+    num_tokens = len(tokens)
+    num_windows = num_tokens - segment_length + 1
+    positions = np.arange(num_tokens)
+    
+    # Index of the previous occurrence of each token (-1 for its first occurrence)
+    order = np.argsort(tokens, kind='stable')
+    previous = np.full(num_tokens, -1)
+    same = tokens[order[1:]] == tokens[order[:-1]]
+    previous[order[1:][same]] = order[:-1][same]
+    
+    # A token adds one type to every window that contains it but not its previous
+    # occurrence, so summing those window counts gives the total types over all windows
+    first_start = np.maximum(previous + 1, positions - segment_length + 1)
+    last_start = np.minimum(positions, num_windows - 1)
+    distinct_sum = np.clip(last_start - first_start + 1, 0, None).sum()
     
-    # Tokenize (excluding punctuation & spaces & numbers)
-    words = [token.text for token in doc if token.is_alpha]  
+    return float(distinct_sum / (segment_length * num_windows))
+
+def calculate_ttr_spacy(doc, segment_length=30):
+    """Measures the Type-Token Ratio (TTR), Moving Average Type-Token Ratio (MATTR), and Lexical Density of a parsed Doc"""
+    # Tokenize (excluding punctuation & spaces & numbers) as an array of word ids
+    # and parts of speech, so the counts below run in NumPy
+    attrs = doc.to_array([ORTH, IS_ALPHA, POS])
+    is_word = attrs[:, 1].astype(bool)
+    words = attrs[is_word, 0]
+    unique_words = np.unique(words)
+    lexical_words = int(np.isin(attrs[is_word, 2], _LEX_POS_IDS).sum())
 
     # Compute TTR
-    unique_words = set(words)
-    ttr = len(unique_words) / len(words) if words else 0
-    print(f"Tokens (Total words): {len(words)}\nTypes (Unique words): {len(unique_words)}")
+    ttr = len(unique_words) / len(words) if len(words) else 0
+    if VERBOSE:
+        print(f"Tokens (Total words): {len(words)}\nTypes (Unique words): {len(unique_words)}")
     
     # Compute MATTR using sliding window approach
     if len(words) < segment_length:
         mattr = ttr
     else:
-        # Calculate MATTR using sliding window
-        ttr_values = []
-        for i in range(len(words) - segment_length + 1):
-            window = words[i:i + segment_length]
-            window_ttr = len(set(window)) / len(window)
-            ttr_values.append(window_ttr)
-        
-        mattr = sum(ttr_values) / len(ttr_values)  # Average TTR over all windows
+        mattr = calculate_mattr(words, segment_length)  # Average TTR over all windows
 
     # Compute Lexical Density
-    lexical_words = [token.text for token in doc if token.is_alpha and token.pos_ in ['NOUN', 'VERB', 'ADJ', 'ADV']]
-    lexical_density = len(lexical_words) / len(words) if words else 0
-    print(f"Lexical words: {len(lexical_words)}")
+    lexical_density = lexical_words / len(words) if len(words) else 0
+    if VERBOSE:
+        print(f"Lexical words: {lexical_words}")
 
     return ttr, mattr, len(words), len(unique_words), lexical_density
 
-def calculate_dcr(text):
-    """Calculates the ratio of dependent clauses to independent clauses in the text"""
-    filtered_text = filter_text(text)
-    doc = nlp(filtered_text)
-    
+def calculate_dcr(doc):
+    """Calculates the ratio of dependent clauses to independent clauses in a parsed Doc"""
     total_clauses = 0
-    dependent_clauses = 0
     independent_clauses = 0
 
-    print("\nAnalyzing:", text)
-    print("-" * 50)
+    if VERBOSE:
+        print("\nAnalyzing:", doc.text)
+        print("-" * 50)
 
     # identify dependent clauses
-    for token in doc:
-        # Count dependent clauses
-        if token.dep_ in ["ccomp", "advcl", "acl", "relcl", "xcomp", "pcomp"]:
-            dependent_clauses += 1
-            print(f"🔴 Dependent Clause: '{token.text}' (Type: {token.dep_})")
+    dependent_clauses = int(np.isin(doc.to_array(DEP), _DEP_IDS).sum())
+    if VERBOSE:
+        for token in doc:
+            if token.dep_ in _DEP_SET:
+                print(f"🔴 Dependent Clause: '{token.text}' (Type: {token.dep_})")
     
     # identify independent clauses by looking at sentence boundaries and conjunctions
     for sent in doc.sents:
         # Get the root of the sentence
         root = [token for token in sent if token.dep_ == "ROOT"][0]
         
-        # Function to get all coordinated clauses recursively
-        def get_coordinated_clauses(token):
-            clauses = []
-            # Check for direct coordination
-            for child in token.children:
-                if child.dep_ == "conj":
-                    # Get the complete coordinated clause
-                    clause_text = " ".join([t.text for t in child.subtree])
-                    clauses.append(clause_text)
-                    print(f"🟢 Coordinated Clause: '{clause_text}'")
-                    # Recursively check for nested coordination
-                    clauses.extend(get_coordinated_clauses(child))
-            return clauses
-        
-        # Get all coordinated clauses
-        coordinated_clauses = get_coordinated_clauses(root)
-        
         # Count the main clause
-        if root:
-            main_clause = " ".join([t.text for t in root.subtree])
-            independent_clauses += 1
-            print(f"🟢 Main Clause: '{main_clause}'")
+        independent_clauses += 1
+        if VERBOSE:
+            print(f"🟢 Main Clause: '{' '.join(t.text for t in root.subtree)}'")
         
-        # Count each coordinated clause as an independent clause
-        independent_clauses += len(coordinated_clauses)
+        # Count each clause coordinated with it (directly or nested) as an independent clause
+        pending = [root]
+        while pending:
+            for child in pending.pop().children:
+                if child.dep_ == "conj":
+                    independent_clauses += 1
+                    pending.append(child)
+                    if VERBOSE:
+                        print(f"🟢 Coordinated Clause: '{' '.join(t.text for t in child.subtree)}'")
     
     total_clauses = independent_clauses + dependent_clauses
 
@@ -153,19 +235,26 @@ def calculate_dcr(text):
     dcr = dependent_clauses / total_clauses if total_clauses > 0 else 0
     return dcr, dependent_clauses, total_clauses
 
-def analyze_student_writings(student_folder):
-    """Analyzes all writings in a student's folder"""
+def analyze_student_writings(student_folder, n_process=1):
+    """Analyzes all writings in a student's folder (n_process > 1 parses with several processes)"""
     results = []
     folder_path = Path(student_folder)
     
     # Get all text files in the folder
     text_files = sorted(folder_path.glob('*.txt'))
     
-    for file_path in text_files:
-        with open(file_path, "r", encoding="utf8") as myfile:
-            text = myfile.read()
-            ttr, mattr, total_words, unique_words, lexical_density = calculate_ttr_spacy(text)
-            dcr, dependent_clauses, total_clauses = calculate_dcr(text)
+    # Read the files (or their cached filtered text) on a few threads so disk I/O
+    # overlaps with parsing. Filtering uses the shared spaCy tokenizer, so it stays in
+    # the thread that feeds the pipeline; the texts are streamed through with each
+    # file's path as context, and each Doc is shared by both metrics
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        contents = executor.map(read_file, text_files)
+        texts = ((filter_file(*content), file_path) for content, file_path in zip(contents, text_files))
+        docs = nlp.pipe(texts, as_tuples=True, batch_size=64, n_process=n_process)
+        
+        for doc, file_path in docs:
+            ttr, mattr, total_words, unique_words, lexical_density = calculate_ttr_spacy(doc)
+            dcr, dependent_clauses, total_clauses = calculate_dcr(doc)
             
             results.append({
                 'file_name': file_path.name,
@@ -182,6 +271,34 @@ def analyze_student_writings(student_folder):
     
     return results
 
+def _init_worker(verbose):
+    """Pool initializer: copies the parent's VERBOSE setting (spawned workers re-import this module)"""
+    global VERBOSE
+    VERBOSE = verbose
+
+def _analyze_folder(folder, n_process=1):
+    """Analyzes one student folder and returns (student name, results)"""
+    print(f"Analyzing writings in folder: {folder.name}")
+    return folder.name, analyze_student_writings(folder, n_process)
+
+def _analyze_folders(student_folders):
+    """Yields (student name, results) for every folder, using all cores"""
+    cpu_count = os.cpu_count() or 1
+    
+    # Pool workers can't start processes of their own, so a single folder is
+    # analyzed here and its files are parsed by several processes instead
+    if len(student_folders) == 1:
+        yield _analyze_folder(student_folders[0], n_process=max(1, cpu_count - 1))
+        return
+    
+    # Student folders are independent, so analyze them in parallel. With the spawn
+    # start method (Windows, macOS) each worker re-imports this module and loads its
+    # own spaCy model; with fork (the Linux default) workers inherit the model the
+    # parent already loaded, so no per-worker load happens
+    processes = max(1, min(cpu_count, len(student_folders)))
+    with Pool(processes, initializer=_init_worker, initargs=(VERBOSE,)) as pool:
+        yield from pool.imap_unordered(_analyze_folder, student_folders)
+
 def create_student_report(student_name, results):
     """Creates a Word document with analysis results for a student"""
     doc = Document()
@@ -190,8 +307,8 @@ def create_student_report(student_name, results):
     doc.add_heading(f'Writing Development Analysis - {student_name}', 0)
     doc.add_paragraph(f'Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
     
-    # Create table with results
-    table = doc.add_table(rows=len(results) + 1, cols=10)
+    # Create table with the header row; data rows are appended below
+    table = doc.add_table(rows=1, cols=10)
     table.style = 'Table Grid'
     
     # Add headers
@@ -200,18 +317,39 @@ def create_student_report(student_name, results):
     for i, header in enumerate(headers):
         table.cell(0, i).text = header
     
-    # Add data
-    for i, result in enumerate(results, start=1):
-        table.cell(i, 0).text = result['date']
-        table.cell(i, 1).text = str(result['total_words'])
-        table.cell(i, 2).text = str(result['unique_words'])
-        table.cell(i, 3).text = f"{result['ttr']:.2f} ({result['ttr']*100:.2f}%)"
-        table.cell(i, 4).text = f"{result['mattr']:.2f} ({result['mattr']*100:.2f}%)"
-        table.cell(i, 5).text = f"{result['lexical_density']:.2f} ({result['lexical_density']*100:.2f}%)"
-        table.cell(i, 6).text = f"{result['dcr']:.2f} ({result['dcr']*100:.2f}%)"
-        table.cell(i, 7).text = str(result['dependent_clauses'])
-        table.cell(i, 8).text = str(result['total_clauses'])
-        table.cell(i, 9).text = result['file_name']
+    # Add data, building each row's XML directly instead of going through
+    # python-docx's per-cell objects; every cell reuses the header cell properties
+    tbl = table._tbl
+    tc_pr = table.cell(0, 0)._tc.tcPr
+    for result in results:
+        values = [
+            result['date'],
+            str(result['total_words']),
+            str(result['unique_words']),
+            f"{result['ttr']:.2f} ({result['ttr']*100:.2f}%)",
+            f"{result['mattr']:.2f} ({result['mattr']*100:.2f}%)",
+            f"{result['lexical_density']:.2f} ({result['lexical_density']*100:.2f}%)",
+            f"{result['dcr']:.2f} ({result['dcr']*100:.2f}%)",
+            str(result['dependent_clauses']),
+            str(result['total_clauses']),
+            result['file_name']
+        ]
+        tr = OxmlElement('w:tr')
+        for value in values:
+            t = OxmlElement('w:t')
+            t.text = value
+            # Word trims leading/trailing whitespace unless told to keep it
+            if value != value.strip():
+                t.set(qn('xml:space'), 'preserve')
+            r = OxmlElement('w:r')
+            r.append(t)
+            p = OxmlElement('w:p')
+            p.append(r)
+            tc = OxmlElement('w:tc')
+            tc.append(copy.deepcopy(tc_pr))
+            tc.append(p)
+            tr.append(tc)
+        tbl.append(tr)
     
     # Save the document
     doc.save(f'{student_name}_analysis_report.docx')
@@ -223,11 +361,9 @@ def main():
     student_folders = [f for f in base_path.iterdir() if f.is_dir()]
     all_results = {}
     
-    for folder in student_folders:
-        print(f"Analyzing writings in folder: {folder.name}")
-        results = analyze_student_writings(folder)
-        all_results[folder.name] = results
-        create_student_report(folder.name, results)
+    for student_name, results in _analyze_folders(student_folders):
+        all_results[student_name] = results
+        create_student_report(student_name, results)
     
     # Get unique dates for all the students
     all_dates = set()